@@ -7,43 +7,133 @@
 # Enhanced GUI by Claude 3.7 Sonnet
 
 import pandas as pd
+import numpy as np
 from geopy.geocoders import Nominatim
-from geopy.exc import GeocoderTimedOut, GeocoderServiceError
+from geopy.adapters import AioHTTPAdapter
+from geopy.extra.rate_limiter import AsyncRateLimiter
+from geopy.exc import GeocoderServiceError
 import tkinter as tk
 from tkinter import filedialog, messagebox
 from tkinter import ttk
 import re
-import time
 import threading
-from PIL import Image, ImageTk
 import os
 from ttkthemes import ThemedStyle
-import base64
-import io
+import functools
+import sqlite3
+import asyncio
+import importlib.util
+
+# Degrees/minutes/seconds format, e.g. 46 ° 12' 12.10" N or 46 deg 12' 12.10" N
+_DMS_RE = re.compile(r"(\-?\d+)\s?(°|deg)?\s*(\d+)'?\s*(\d+(?:\.\d+)?)[\"\u201C\u201D\u2033]?\s*([NSEW]?)", re.IGNORECASE)
+_DIRS_NEG = frozenset('sw')
+
+# xlsxwriter writes workbooks noticeably faster than openpyxl; use it when it's installed
+EXCEL_WRITER = "xlsxwriter" if importlib.util.find_spec("xlsxwriter") else "openpyxl"
+# The user's file is overwritten in place, so cells must round-trip unchanged. By default
+# xlsxwriter turns URL strings into hyperlinks and drops the ones it can't store (over 2079
+# characters, or past 65,530 per sheet).
+EXCEL_WRITER_KWARGS = {"options": {"strings_to_urls": False}} if EXCEL_WRITER == "xlsxwriter" else {}
+
+# Reverse-geocode results are cached on disk so repeat runs (and repeated
+# coordinates within a run) don't hit Nominatim again.
+CACHE_PATH = os.path.join(os.path.expanduser("~"), ".geowizard_cache.sqlite")
+# Results that reflect a transient failure rather than an answer - never cached
+UNCACHED_RESULTS = ("Geocoding failed", "Error during geocoding")
+# Decimals kept in cache keys: 4 (~10 m) folds GPS jitter into one lookup, 5 (~1 m) is stricter
+CACHE_PRECISION = 4
+
+def _qkey(lat, lon):
+    """Quantizes coordinates to the cache key precision."""
+    return (round(lat, CACHE_PRECISION), round(lon, CACHE_PRECISION))
+
+_cache_lock = threading.Lock()
+# The whole cache is loaded at startup so lookups are plain dict hits. Keys are
+# re-quantized in case rows were stored with a different CACHE_PRECISION.
+_cache = {}
+try:
+    _cache_db = sqlite3.connect(CACHE_PATH, check_same_thread=False)
+    _cache_db.execute("PRAGMA journal_mode=WAL")
+    _cache_db.execute("CREATE TABLE IF NOT EXISTS cache (lat REAL, lon REAL, addr TEXT, PRIMARY KEY(lat, lon))")
+    _cache_db.commit()
+    for _lat, _lon, _addr in _cache_db.execute("SELECT lat, lon, addr FROM cache"):
+        _cache.setdefault(_qkey(_lat, _lon), _addr)
+except sqlite3.Error as e:
+    # An unwritable, locked or corrupt cache file must not stop the app from starting
+    print(f"Could not open the geocode cache {CACHE_PATH}: {e}. Results will only be cached until the app closes.")
+    _cache_db = None
+
+# Number of reverse lookups in flight at once. The rate limiter still enforces
+# Nominatim's 1 request/second policy; a higher value helps a self-hosted server.
+GEOCODE_CONCURRENCY = 4
+
+async def _reverse(geolocator, query, **kwargs):
+    """Reverse lookup on the given run's geocoder."""
+    return await geolocator.reverse(query, **kwargs)
+
+# The rate limiter spaces requests 1 s apart (Nominatim's usage policy), retries
+# timeouts/service errors and re-raises if they persist. It lives at module level,
+# taking each run's geocoder as an argument, so the spacing also holds across
+# back-to-back runs.
+_REVERSE = AsyncRateLimiter(_reverse, min_delay_seconds=1.0, max_retries=3,
+                            error_wait_seconds=2.0, swallow_exceptions=False,
+                            return_value_on_exception=None)
+
+def _cache_store(key, address):
+    """Saves an address for a quantized (lat, lon) key."""
+    _cache[key] = address
+    if _cache_db is None:
+        return
 
-def geocode_address(latitude, longitude, retries=3):
+    try:
+        with _cache_lock:
+            _cache_db.execute("INSERT OR REPLACE INTO cache (lat, lon, addr) VALUES (?, ?, ?)", (*key, address))
+            _cache_db.commit()
+    except sqlite3.Error as e:
+        print(f"Could not save to the geocode cache: {e}")
+
+def cached_geocode(func):
+    """Caches geocode results keyed by coordinates rounded to CACHE_PRECISION decimals."""
+    @functools.wraps(func)
+    async def wrapper(latitude, longitude, *args, **kwargs):
+        key = _qkey(latitude, longitude)
+        if key in _cache:
+            return _cache[key]
+
+        address = await func(latitude, longitude, *args, **kwargs)
+        if address not in UNCACHED_RESULTS:
+            _cache_store(key, address)
+        return address
+    return wrapper
+
+@cached_geocode
+async def geocode_address(latitude, longitude, geolocator):
     """Geocodes a latitude/longitude pair to an address in English."""
-    geolocator = Nominatim(user_agent="geo_app")
+    try:
+        location = await _REVERSE(geolocator, (latitude, longitude), timeout=10, language="en")
+        return location.address if location else "Address not found"
 
-    for attempt in range(retries):
-        try:
-            location = geolocator.reverse((latitude, longitude), timeout=10, language="en")
-            if location:
-                return location.address
-            else:
-                return "Address not found"
-
-        except (GeocoderTimedOut, GeocoderServiceError) as e:
-            print(f"Geocoding failed: {e}. Retrying ({attempt + 1}/{retries})...")
-            if attempt < retries - 1:
-                time.sleep(2)
-            else:
-                print(f"Geocoding failed after {retries} retries.")
-                return "Geocoding failed"
+    except GeocoderServiceError as e:  # Includes GeocoderTimedOut, after the limiter's retries
+        print(f"Geocoding failed: {e}")
+        return "Geocoding failed"
 
-        except Exception as e:
-            print(f"An unexpected error occurred: {e}")
-            return "Error during geocoding"
+    except Exception as e:
+        print(f"An unexpected error occurred: {e}")
+        return "Error during geocoding"
+
+async def geocode_rows(locations, on_result):
+    """Reverse geocodes (key, lat, lon) locations concurrently, calling on_result(key, address) as each one finishes."""
+    # A fresh geocoder per run: its aiohttp session belongs to this run's event loop and
+    # can't be reused once closed. All lookups in the run share it (keep-alive, one TLS handshake).
+    async with Nominatim(user_agent="geo_app", adapter_factory=AioHTTPAdapter) as geolocator:
+        semaphore = asyncio.Semaphore(GEOCODE_CONCURRENCY)
+
+        async def geocode_row(key, lat, lon):
+            async with semaphore:
+                address = await geocode_address(lat, lon, geolocator)
+            on_result(key, address)
+
+        await asyncio.gather(*(geocode_row(key, lat, lon) for key, lat, lon in locations))
 
 def convert_coordinates(coord):
     """Converts coordinates from various formats to decimal degrees."""
@@ -53,7 +143,7 @@ def convert_coordinates(coord):
             return float(coord)
         except ValueError:
             # If direct conversion fails, try the more complex format
-            match = re.match(r"(\-?\d+)\s?(°|deg)?\s*(\d+)'?\s*(\d+(?:\.\d+)?)[\"\"]?\s*([NSEW]?)", coord, re.IGNORECASE)
+            match = _DMS_RE.match(coord)
             if match:
                 degrees = float(match.group(1))
                 minutes = float(match.group(3))
@@ -62,7 +152,7 @@ def convert_coordinates(coord):
 
                 decimal_degrees = abs(degrees) + (minutes / 60) + (seconds / 3600)
                 # Apply negative sign if original degrees were negative or if direction is S/W
-                if degrees < 0 or direction.lower() in ('s', 'w'):
+                if degrees < 0 or direction.lower() in _DIRS_NEG:
                     decimal_degrees *= -1
                 return decimal_degrees
             return None
@@ -70,130 +160,216 @@ def convert_coordinates(coord):
         return float(coord)
     return None
 
+def parse_coordinate_column(column):
+    """Converts a column of coordinates to decimal degrees.
+
+    Plain numbers are converted in one vectorized pass; only the cells that fail
+    are run through convert_coordinates. Returns the converted values and a mask
+    of cells that held something that could not be parsed.
+    """
+    if pd.api.types.is_numeric_dtype(column):
+        # Numeric column: already decimal degrees, and blank cells are NaN rather than "nan"
+        return column.astype(float), pd.Series(False, index=column.index)
+
+    values = pd.to_numeric(column, errors='coerce')
+    mask = values.isna() & column.notna()
+    values.loc[mask] = column.loc[mask].map(convert_coordinates).astype(float)
+    invalid = values.isna() & column.notna()
+    return values, invalid
+
+# Last parsed workbook, reused while the file on disk is unchanged (e.g. re-running after failures)
+_cached = {"path": None, "mtime": None, "df": None}
+
+def read_workbook(file_path):
+    """Parses the Excel file into a DataFrame, reusing the last parse if the file hasn't changed"""
+    mtime = os.path.getmtime(file_path)
+    if _cached["path"] != file_path or _cached["mtime"] != mtime:
+        _cached.update(path=file_path, mtime=mtime, df=pd.read_excel(file_path, engine='openpyxl'))
+    return _cached["df"].copy()
+
 def process_file_threaded():
     """Run the processing in a separate thread to keep the UI responsive"""
-    threading.Thread(target=process_file, daemon=True).start()
-
-def process_file():
-    file_path = file_path_entry.get()
-    lon_col = lon_col_var.get()
-    lat_col = lat_col_var.get()
-    
-    # Disable buttons during processing
+    # Read the inputs and disable the buttons here, on the Tk thread
     process_button.config(state=tk.DISABLED)
     browse_button.config(state=tk.DISABLED)
-    
+    threading.Thread(target=process_file, args=(file_path_entry.get(), lat_col_var.get(), lon_col_var.get()),
+                     daemon=True).start()
+
+def process_file(file_path, lat_col, lon_col):
+    # This runs on a worker thread: all widget updates are queued to the Tk main loop with root.after
     try:
-        df = pd.read_excel(file_path)
+        df = read_workbook(file_path)
     except FileNotFoundError:
-        messagebox.showerror("Error", "File not found.")
-        reset_ui()
+        root.after(0, finish_run, messagebox.showerror, "Error", "File not found.")
         return
     except Exception as e:
-        messagebox.showerror("Error", f"Error reading Excel file: {e}")
-        reset_ui()
+        root.after(0, finish_run, messagebox.showerror, "Error", f"Error reading Excel file: {e}")
         return
 
     if lon_col not in df.columns or lat_col not in df.columns:
-        messagebox.showerror("Error", "Invalid column names.")
-        reset_ui()
+        root.after(0, finish_run, messagebox.showerror, "Error", "Invalid column names.")
         return
 
-    df['Address'] = ""
-
     total_rows = len(df)
-    progress_bar["maximum"] = total_rows
-    
-    # Update the status indicators
-    status_frame.pack(fill=tk.X, padx=20, pady=10)
-    progress_bar.pack(fill=tk.X, padx=20, pady=(0, 10))
+    root.after(0, show_processing, total_rows)
 
     successful_count = 0
-    unsuccessful_count = 0
-    
-    # Show processing panel
-    processing_frame.pack(fill=tk.BOTH, expand=True, padx=20, pady=10)
-    root.update_idletasks()
 
-    for index, row in df.iterrows():
-        lat_str = str(row[lat_col])
-        lon_str = str(row[lon_col])
-
-        # Update coordinates display
-        coords_var.set(f"Coordinates: {lat_str}, {lon_str}")
-        
-        lat = convert_coordinates(lat_str)
-        lon = convert_coordinates(lon_str)
-
-        if lat is None or lon is None:
-            df.loc[index, 'Address'] = "Invalid Coordinates"
-            unsuccessful_count += 1
-            # Update the row status in the current_status variable
-            current_status_var.set(f"Status: Processing row {index + 1} of {total_rows}")
-            current_status_var.set("Status: Invalid Coordinates")
-            root.update_idletasks()
-            update_progress(index, successful_count, unsuccessful_count, total_rows)
-            time.sleep(0.05)  # Small delay for visual effect
-            continue
-
-        if pd.isna(lat) or pd.isna(lon) or not (isinstance(lat, (int, float)) and isinstance(lon, (int, float))):
-            df.loc[index, 'Address'] = "No Coordinates"
-            unsuccessful_count += 1
-            current_status_var.set("Status: No Coordinates")
-            update_progress(index, successful_count, unsuccessful_count, total_rows)
-            root.update_idletasks()
-            time.sleep(0.05)
-            continue
-
-        # Show "Geocoding..." message
-        current_status_var.set("Status: Geocoding...")
-        root.update_idletasks()
-        
-        address = geocode_address(lat, lon)
-        df.loc[index, 'Address'] = address
-
-        # Update address display
-        address_var.set(f"Address: {address[:100]}{'...' if len(address) > 100 else ''}")
+    # Rows with usable coordinates, grouped by cache key (_qkey) so each location is geocoded once
+    pending_rows = {}
+    # Exact coordinates of each group's first row - that is what gets sent to Nominatim
+    locations = {}
+    addresses = [""] * total_rows  # Written to the Address column in one go once done
+
+    lat_values, lat_invalid = parse_coordinate_column(df[lat_col])
+    lon_values, lon_invalid = parse_coordinate_column(df[lon_col])
+
+    # Rows that can't be geocoded are settled up front with array masks
+    invalid_mask = (lat_invalid | lon_invalid).to_numpy()
+    missing_mask = (lat_values.isna() | lon_values.isna()).to_numpy() & ~invalid_mask
+    for index in np.flatnonzero(invalid_mask):
+        addresses[index] = "Invalid Coordinates"
+    for index in np.flatnonzero(missing_mask):
+        addresses[index] = "No Coordinates"
+
+    unsuccessful_count = processed_count = int(invalid_mask.sum() + missing_mask.sum())
+    if processed_count:
+        root.after(0, update_progress, processed_count - 1, successful_count, unsuccessful_count, total_rows)
+
+    valid = np.flatnonzero(~(invalid_mask | missing_mask))
+    lat_valid = lat_values.to_numpy()[valid].tolist()
+    lon_valid = lon_values.to_numpy()[valid].tolist()
+    for index, lat, lon in zip(valid.tolist(), lat_valid, lon_valid):
+        key = _qkey(lat, lon)
+        if key not in pending_rows:
+            pending_rows[key] = []
+            locations[key] = (lat, lon)
+        pending_rows[key].append(index)
+
+    # Only refresh the display every `step` rows (at most ~100 redraws, however big the file),
+    # plus the first result so a slow run doesn't look stalled
+    step = max(1, total_rows // 100)
+    first_result = True
+
+    def on_result(key, address):
+        nonlocal successful_count, unsuccessful_count, processed_count, first_result
+        rows = pending_rows[key]
+        for index in rows:
+            addresses[index] = address
+        processed_count += len(rows)
 
         if (address == "Address not found" or address == "Geocoding failed" or address == "Error during geocoding" or
                 address == "No Coordinates" or address == "Invalid Coordinates"):
-            unsuccessful_count += 1
-            current_status_var.set(f"Status: {address}")
+            unsuccessful_count += len(rows)
+            status = f"Status: {address}"
         else:
-            successful_count += 1
-            current_status_var.set("Status: Success")
+            successful_count += len(rows)
+            status = "Status: Success"
+
+        if (first_result or processed_count // step != (processed_count - len(rows)) // step
+                or processed_count == total_rows):
+            first_result = False
+            # Show the coordinates as written in the sheet
+            coords = f"{df[lat_col].iat[rows[0]]}, {df[lon_col].iat[rows[0]]}"
+            root.after(0, show_result, coords, address, status,
+                       processed_count - 1, successful_count, unsuccessful_count, total_rows)
 
-        update_progress(index, successful_count, unsuccessful_count, total_rows)
-        root.update_idletasks()
-        time.sleep(0.05)  # Small delay for visual effect
+    # Show "Geocoding..." message
+    root.after(0, set_text, current_status_var, "Status: Geocoding...")
 
     try:
-        df.to_excel(file_path, index=False)
-        messagebox.showinfo("Success", f"Process complete!\n\nSuccessfully geocoded: {successful_count} addresses\nUnsuccessful: {unsuccessful_count} addresses\n\nResults saved to {file_path}")
+        asyncio.run(geocode_rows([(key, lat, lon) for key, (lat, lon) in locations.items()], on_result))
     except Exception as e:
-        messagebox.showerror("Error", f"Error saving Excel file: {e}")
-    
-    reset_ui()
+        # e.g. aiohttp missing - report it instead of leaving the buttons disabled
+        root.after(0, finish_run, messagebox.showerror, "Error", f"Error during geocoding: {e}")
+        return
+
+    try:
+        # Re-running on an already processed file often gives the same addresses - skip the rewrite then
+        unchanged = 'Address' in df.columns and df['Address'].tolist() == addresses
+        df['Address'] = addresses
+
+        if unchanged:
+            saved = f"Addresses unchanged, {file_path} was not rewritten"
+        else:
+            df.to_excel(file_path, index=False, engine=EXCEL_WRITER, engine_kwargs=EXCEL_WRITER_KWARGS)
+            # What was just saved is what a re-run on this file would parse
+            _cached.update(path=file_path, mtime=os.path.getmtime(file_path), df=df)
+            saved = f"Results saved to {file_path}"
+        root.after(0, finish_run, messagebox.showinfo, "Success", f"Process complete!\n\nSuccessfully geocoded: {successful_count} addresses\nUnsuccessful: {unsuccessful_count} addresses\n\n{saved}")
+    except Exception as e:
+        root.after(0, finish_run, messagebox.showerror, "Error", f"Error saving Excel file: {e}")
+
+def show_processing(total):
+    """Shows the status indicators and processing panel for a new run"""
+    progress_bar["maximum"] = total
+    progress_bar["value"] = 0
+
+    # Clear what the previous run left on screen
+    _shown_text.clear()
+    for target, text in ((success_label, "0"), (failed_label, "0"), (total_processed_label, f"0/{total}"),
+                         (progress_percent, "0%"), (coords_var, "Coordinates: "), (address_var, "Address: ")):
+        set_text(target, text)
+
+    # Update the status indicators
+    status_frame.pack(fill=tk.X, padx=20, pady=10)
+    progress_bar.pack(fill=tk.X, padx=20, pady=(0, 10))
+
+    # Show processing panel
+    processing_frame.pack(fill=tk.BOTH, expand=True, padx=20, pady=10)
+
+# Text last shown by each progress widget/variable, so unchanged values don't trigger a redraw
+_shown_text = {}
+
+def set_text(target, text):
+    """Sets a label's text or a StringVar's value, skipping it if it is already showing that text"""
+    key = str(target)  # Tk path/variable name (StringVars aren't hashable)
+    if _shown_text.get(key) == text:
+        return
+    _shown_text[key] = text
+    if isinstance(target, tk.Variable):
+        target.set(text)
+    else:
+        target.config(text=text)
+
+def show_result(coords, address, status, current, successful, unsuccessful, total):
+    """Shows the latest processed row in the live information panel"""
+    set_text(coords_var, f"Coordinates: {coords}")
+    if address is not None:
+        set_text(address_var, f"Address: {address[:100]}{'...' if len(address) > 100 else ''}")
+    set_text(current_status_var, status)
+    update_progress(current, successful, unsuccessful, total)
 
 def update_progress(current, successful, unsuccessful, total):
     """Updates progress bar and statistics"""
     progress_bar["value"] = current + 1
     
     # Update statistics labels with colors based on values
-    success_label.config(text=f"{successful}")
-    failed_label.config(text=f"{unsuccessful}")
-    total_processed_label.config(text=f"{current + 1}/{total}")
+    set_text(success_label, f"{successful}")
+    set_text(failed_label, f"{unsuccessful}")
+    set_text(total_processed_label, f"{current + 1}/{total}")
     
     # Calculate completion percentage
     completion = int(((current + 1) / total) * 100)
-    progress_percent.config(text=f"{completion}%")
+    set_text(progress_percent, f"{completion}%")
+
+def finish_run(show_message, title, message):
+    """Shows the end-of-run message box, then resets the UI"""
+    show_message(title, message)
+    reset_ui()
 
 def reset_ui():
     """Reset UI elements after processing"""
     process_button.config(state=tk.NORMAL)
     browse_button.config(state=tk.NORMAL)
     processing_frame.pack_forget()
-    current_status_var.set("Ready")
+    set_text(current_status_var, "Ready")
+
+def read_column_names(file_path):
+    """Reads just the header row of the first worksheet, without parsing the data"""
+    # Let pandas name the columns (blank and repeated headers included) so the names
+    # picked in the dropdowns always match the columns process_file reads
+    return pd.read_excel(file_path, engine='openpyxl', nrows=0).columns.tolist()
 
 def browse_file():
     file_path = filedialog.askopenfilename(filetypes=[("Excel Files", "*.xlsx")])
@@ -206,8 +382,7 @@ def browse_file():
         file_name_var.set(f"Selected: {filename}")
         
         try:
-            df = pd.read_excel(file_path)
-            column_names = df.columns.tolist()
+            column_names = read_column_names(file_path)
             lon_col_dropdown['values'] = column_names
             lat_col_dropdown['values'] = column_names
             lon_col_dropdown.config(state="readonly")